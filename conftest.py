@@ -0,0 +1,2 @@
+# test_sse.py es un script manual contra un servidor en marcha, no un test
+collect_ignore = ["test_sse.py"]
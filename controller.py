@@ -1,11 +1,404 @@
-from pysnmp.hlapi.v3arch.asyncio import *
+import asyncio
+import collections
+import contextlib
+import functools
+import itertools
+import multiprocessing
+import threading
+import traceback
+import weakref
+from typing import Optional
 
-from pysnmp.proto.rfc1902 import (
-    Integer, OctetString, IpAddress, Counter32,
-    Gauge32, TimeTicks, Opaque, Counter64, Bits
-)
+# Modo de ejecución de las operaciones SNMP:
+#   - "inline":  en el event loop de FastAPI (comportamiento original).
+#   - "thread":  en hilos worker, cada uno con un event loop de larga vida.
+#   - "process": en procesos worker, cada uno con un event loop de larga vida;
+#                el trabajo de CPU de pysnmp deja de competir por el GIL con HTTP.
+# Cada worker atiende muchas operaciones a la vez (la E/S UDP sigue siendo
+# asyncio dentro del worker), así que `workers` solo reparte CPU: un host que
+# no responde no ocupa un worker durante su timeout.
+EXECUTION_MODES = ("inline", "thread", "process")
+EXECUTION_MODE = "inline"
+_workers: list = []
+_worker_index = itertools.count()
 
-async def run_snmp_get(
+# SnmpEngines reutilizados por event loop, uno por juego de credenciales USM.
+# hlapi registra los usuarios del engine solo por nombre: si dos operaciones
+# con el mismo usuario y claves distintas compartieran engine, la segunda
+# borraría las claves localizadas de la primera (delete_v3_user).
+ENGINE_CACHE_SIZE = 32
+_engines = weakref.WeakKeyDictionary()
+
+# SnmpEngine precreado en segundo plano (ver warm_engine): crear uno cuesta
+# ~100 ms de CPU por la carga de MIBs
+_spare_engines = collections.deque()
+
+
+@functools.cache
+def hlapi():
+    """
+    Importa pysnmp.hlapi.v3arch.asyncio bajo demanda.
+
+    Es el import más pesado de la aplicación (~0.3 s en frío), por eso no se
+    hace al cargar el módulo: lo resuelve la primera operación SNMP o el
+    calentamiento en segundo plano que lanza main.startup_event.
+    """
+    import pysnmp.hlapi.v3arch.asyncio as module
+    return module
+
+
+def get_protocol(name: str):
+    """
+    Devuelve la constante PySNMP de protocolo (p. ej. "usmHMACSHAAuthProtocol").
+    """
+    return getattr(hlapi(), name)
+
+
+def warm_engine():
+    """
+    Crea un SnmpEngine de reserva para que la primera operación no lo pague.
+
+    Se puede llamar desde cualquier hilo: el engine no queda ligado a un
+    event loop hasta que hlapi configura su transporte.
+    """
+    _spare_engines.append(hlapi().SnmpEngine())
+
+
+def _new_engine():
+    try:
+        return _spare_engines.popleft()
+    except IndexError:
+        return hlapi().SnmpEngine()
+
+
+async def _load_hlapi():
+    # Si el calentamiento de main aún no terminó, el import se hace en un
+    # hilo para no bloquear el loop de FastAPI
+    if not hlapi.cache_info().currsize:
+        await asyncio.to_thread(hlapi)
+    return hlapi()
+
+
+class _EngineCache:
+    """
+    SnmpEngines de un event loop, uno por juego de credenciales (LRU de
+    ENGINE_CACHE_SIZE). Un engine desalojado se cierra cuando termina su
+    última operación en vuelo.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._engines = collections.OrderedDict()
+        self._in_use = collections.Counter()
+        self._retired = set()
+
+    @contextlib.contextmanager
+    def acquire(self, credentials):
+        engine = self._engines.pop(credentials, None)
+        if engine is None:
+            engine = _new_engine()
+        self._engines[credentials] = engine
+        while len(self._engines) > self.size:
+            _, old = self._engines.popitem(last=False)
+            self._retire(old)
+
+        self._in_use[engine] += 1
+        try:
+            yield engine
+        finally:
+            self._in_use[engine] -= 1
+            if not self._in_use[engine]:
+                del self._in_use[engine]
+                if engine in self._retired:
+                    self._retired.discard(engine)
+                    engine.close_dispatcher()
+
+    def _retire(self, engine):
+        if engine in self._in_use:
+            self._retired.add(engine)
+        else:
+            engine.close_dispatcher()
+
+    def close(self):
+        for engine in self._engines.values():
+            engine.close_dispatcher()
+        self._engines.clear()
+
+
+def _engine(user: str, usm_kwargs: dict):
+    """
+    Reserva el SnmpEngine del loop en curso para estas credenciales; se usa
+    como `with _engine(...) as engine:` durante toda la operación.
+    """
+    loop = asyncio.get_running_loop()
+    cache = _engines.get(loop)
+    if cache is None:
+        cache = _engines[loop] = _EngineCache(ENGINE_CACHE_SIZE)
+    credentials = (user, *sorted(usm_kwargs.items()))
+    return cache.acquire(credentials)
+
+
+def configure_execution(mode: str, workers: Optional[int] = None):
+    """
+    Selecciona el modo de ejecución (ver EXECUTION_MODES) y arranca los workers.
+
+    Parámetros:
+        - mode: "inline", "thread" o "process".
+        - workers: cantidad de workers; None usa uno por CPU.
+    """
+    global EXECUTION_MODE
+
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Modo de ejecución no soportado: {mode}")
+
+    shutdown_execution()
+    count = workers or multiprocessing.cpu_count()
+    if mode == "thread":
+        _workers.extend(_ThreadWorker(f"snmp-{i}") for i in range(count))
+    elif mode == "process":
+        # spawn: el proceso principal ya tiene hilos (receptor de traps)
+        ctx = multiprocessing.get_context("spawn")
+        _workers.extend(_ProcessWorker(ctx) for _ in range(count))
+    EXECUTION_MODE = mode
+
+
+def shutdown_execution():
+    """
+    Detiene los workers, si existen, y vuelve al modo inline.
+    """
+    global EXECUTION_MODE
+
+    for worker in _workers:
+        worker.stop()
+    _workers.clear()
+    EXECUTION_MODE = "inline"
+
+
+class _ThreadWorker:
+    """
+    Hilo con un event loop propio; las operaciones se envían con
+    run_coroutine_threadsafe y corren concurrentemente en ese loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self._stopping = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.thread.is_alive()
+
+    def restart(self):
+        return _ThreadWorker(self.name)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        # Precalienta hlapi y un SnmpEngine de reserva
+        self.loop.call_soon(warm_engine)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def call(self, func, args, kwargs):
+        if self._stopping:
+            raise RuntimeError("El worker SNMP se detuvo")
+        future = asyncio.run_coroutine_threadsafe(func(*args, **kwargs), self.loop)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Cancelada por stop(), no por quien espera: se informa como error
+            if self._stopping and not asyncio.current_task().cancelling():
+                raise RuntimeError("El worker SNMP se detuvo") from None
+            raise
+
+    def stop(self):
+        self._stopping = True
+        if not self.alive:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(_cancel_loop_tasks(), self.loop).result(timeout=1)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
+
+
+async def _cancel_loop_tasks():
+    # Cancela las operaciones en vuelo del loop actual y cierra sus engines
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    cache = _engines.pop(asyncio.get_running_loop(), None)
+    if cache is not None:
+        cache.close()
+
+
+class _ProcessWorker:
+    """
+    Proceso con un event loop propio (ver _process_worker_main). Las
+    peticiones viajan por un Pipe con un id; un hilo lector resuelve el
+    future correspondiente cuando llega la respuesta, así que puede haber
+    muchas operaciones en vuelo por proceso.
+    """
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self.alive = True
+        self._conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_process_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self._pending = {}
+        self._ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def restart(self):
+        return _ProcessWorker(self._ctx)
+
+    async def call(self, func, args, kwargs):
+        if not self.alive:
+            raise RuntimeError("El worker SNMP terminó")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._ids)
+        self._pending[request_id] = (loop, future)
+        try:
+            with self._send_lock:
+                self._conn.send((request_id, func, args, kwargs))
+        except Exception:
+            self._pending.pop(request_id, None)
+            raise
+        return await future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            loop, future = self._pending.pop(request_id)
+            _resolve_threadsafe(loop, future, ok, value)
+
+        # El proceso terminó: falla todo lo que quedó pendiente. call() puede
+        # seguir insertando desde otro hilo, por eso se itera sobre una copia
+        # y se repite después de cerrar la conexión
+        self.alive = False
+        self._fail_pending()
+        self._conn.close()
+        self._fail_pending()
+
+    def _fail_pending(self):
+        error = RuntimeError("El worker SNMP terminó")
+        for request_id, (loop, future) in list(self._pending.items()):
+            self._pending.pop(request_id, None)
+            _resolve_threadsafe(loop, future, False, error)
+
+    def stop(self):
+        try:
+            with self._send_lock:
+                self._conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+
+
+def _resolve_threadsafe(loop, future, ok, value):
+    try:
+        loop.call_soon_threadsafe(_resolve, future, ok, value)
+    except RuntimeError:
+        # El loop que hizo la petición ya se cerró
+        pass
+
+
+def _resolve(future, ok, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+def _process_worker_main(conn):
+    # Corre en el proceso worker: el hilo principal ejecuta el loop y un hilo
+    # lector recibe peticiones hasta recibir None (o EOF si el padre murió)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def receive():
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            loop.call_soon_threadsafe(loop.create_task, _serve_request(conn, *message))
+        loop.call_soon_threadsafe(loop.stop)
+
+    threading.Thread(target=receive, daemon=True).start()
+    loop.call_soon(warm_engine)
+    loop.run_forever()
+
+
+async def _serve_request(conn, request_id, func, args, kwargs):
+    try:
+        reply = (request_id, True, await func(*args, **kwargs))
+    except Exception as e:
+        reply = (request_id, False, e)
+    try:
+        conn.send(reply)
+    except Exception as e:
+        # Resultado o excepción no serializable
+        conn.send((request_id, False, Exception(f"{type(e).__name__}: {e}")))
+
+
+async def _dispatch(func, *args, **kwargs):
+    if not _workers:
+        return await func(*args, **kwargs)
+
+    index = next(_worker_index) % len(_workers)
+    worker = _workers[index]
+    if not worker.alive:
+        # El worker murió (p. ej. el proceso fue terminado): se reemplaza
+        worker = _workers[index] = worker.restart()
+    return await worker.call(func, args, kwargs)
+
+
+async def run_snmp_get(*args, **kwargs):
+    """
+    SNMPv3 GET; los parámetros son los de _snmp_get. Se ejecuta según
+    EXECUTION_MODE.
+    """
+    return await _dispatch(_snmp_get, *args, **kwargs)
+
+
+async def run_snmp_getnext(*args, **kwargs):
+    """
+    SNMPv3 GETNEXT; los parámetros son los de _snmp_getnext. Se ejecuta según
+    EXECUTION_MODE.
+    """
+    return await _dispatch(_snmp_getnext, *args, **kwargs)
+
+
+async def run_snmp_set(*args, **kwargs):
+    """
+    SNMPv3 SET; los parámetros son los de _snmp_set. Se ejecuta según
+    EXECUTION_MODE.
+    """
+    return await _dispatch(_snmp_set, *args, **kwargs)
+
+async def _snmp_get(
         ip, 
         user, 
         oid_numeric,
@@ -13,9 +406,15 @@ async def run_snmp_get(
         security_level: str = "noAuthNoPriv",
         auth_key: str = None,
         priv_key: str = None,
-        auth_protocol = usmNoAuthProtocol,
-        priv_protocol = usmNoPrivProtocol,
+        auth_protocol: str = None,
+        priv_protocol: str = None,
 ):
+    # Los protocolos llegan por nombre (p. ej. "usmHMACSHAAuthProtocol") y se
+    # resuelven aquí, ya dentro del loop que ejecuta la operación
+    h = await _load_hlapi()
+    auth_protocol = getattr(h, auth_protocol or "usmNoAuthProtocol")
+    priv_protocol = getattr(h, priv_protocol or "usmNoPrivProtocol")
+
     # Se construyen los parametros de USM segun el nivel especificado
     usm_kwargs = {}
 
@@ -38,7 +437,7 @@ async def run_snmp_get(
 
     # 3) Creación de UsmUserData
     try:
-        user_data = UsmUserData(user, **usm_kwargs)
+        user_data = h.UsmUserData(user, **usm_kwargs)
     except Exception as e:
         # Aquí te dice si alguno de los parámetros está mal
         print("[ERROR] al crear UsmUserData:", e)
@@ -47,13 +446,14 @@ async def run_snmp_get(
 
     # 4) Ejecución del GET
     try:
-        iterator = await get_cmd(
-            SnmpEngine(),
-            user_data,
-            await UdpTransportTarget.create((ip, 161)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_numeric))
-        )
+        with _engine(user, usm_kwargs) as engine:
+            iterator = await h.get_cmd(
+                engine,
+                user_data,
+                await h.UdpTransportTarget.create((ip, 161)),
+                h.ContextData(),
+                h.ObjectType(h.ObjectIdentity(oid_numeric))
+            )
         # --- DEBUG AÑADIDO ---
         errorIndication, errorStatus, errorIndex, varBinds = iterator
         print("[SNMP REPLY] errorIndication:", errorIndication)
@@ -82,7 +482,7 @@ async def run_snmp_get(
     else:
         result = []
         for oid, val in varBinds:
-            if isinstance(val, OctetString):
+            if isinstance(val, h.OctetString):
                 texto = val.asOctets().decode('utf-8', errors='ignore')
                 result.append(f"{oid.prettyPrint()} = {texto}")
             else:
@@ -91,7 +491,7 @@ async def run_snmp_get(
 
 
 
-async def run_snmp_getnext(
+async def _snmp_getnext(
         ip, 
         user, 
         oid_numeric,
@@ -99,10 +499,16 @@ async def run_snmp_getnext(
         security_level: str = "noAuthNoPriv",
         auth_key: str = None,
         priv_key: str = None,
-        auth_protocol = usmNoAuthProtocol,
-        priv_protocol = usmNoPrivProtocol,        
+        auth_protocol: str = None,
+        priv_protocol: str = None,        
 ):
 
+    # Los protocolos llegan por nombre (p. ej. "usmHMACSHAAuthProtocol") y se
+    # resuelven aquí, ya dentro del loop que ejecuta la operación
+    h = await _load_hlapi()
+    auth_protocol = getattr(h, auth_protocol or "usmNoAuthProtocol")
+    priv_protocol = getattr(h, priv_protocol or "usmNoPrivProtocol")
+
     # Se construyen los parametros de USM segun el nivel especificado
     usm_kwargs = {}
 
@@ -125,7 +531,7 @@ async def run_snmp_getnext(
 
     # 3) Creación de UsmUserData
     try:
-        user_data = UsmUserData(user, **usm_kwargs)
+        user_data = h.UsmUserData(user, **usm_kwargs)
     except Exception as e:
         # Aquí te dice si alguno de los parámetros está mal
         print("[ERROR] al crear UsmUserData:", e)
@@ -134,15 +540,16 @@ async def run_snmp_getnext(
    
     # 4) Ejecución del GETNEXT
     try:
-        iterator = await next_cmd(
-            SnmpEngine(),
-            user_data,
-            await UdpTransportTarget.create((ip, 161)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_numeric)),
-            lexicographicMode=False,  # para que solo devuelva el siguiente OID, no todo el árbol
-            maxCalls=1  # para obtener solo un resultado
-        )
+        with _engine(user, usm_kwargs) as engine:
+            iterator = await h.next_cmd(
+                engine,
+                user_data,
+                await h.UdpTransportTarget.create((ip, 161)),
+                h.ContextData(),
+                h.ObjectType(h.ObjectIdentity(oid_numeric)),
+                lexicographicMode=False,  # para que solo devuelva el siguiente OID, no todo el árbol
+                maxCalls=1  # para obtener solo un resultado
+            )
 
         # --- DEBUG AÑADIDO ---
         errorIndication, errorStatus, errorIndex, varBinds = iterator
@@ -164,10 +571,10 @@ async def run_snmp_getnext(
     for oid, val in varBinds:
         # Si de verdad no quieres filtrar nada, ni EndOfMibView, ni NoSuchInstance,
         # quitas este if. Pero normalmente conviene al menos salir si es fin de MIB:
-        if isinstance(val, (EndOfMibView, NoSuchInstance)):
+        if isinstance(val, (h.EndOfMibView, h.NoSuchInstance)):
             break
 
-        if isinstance(val, OctetString):
+        if isinstance(val, h.OctetString):
             texto = val.asOctets().decode('utf-8', errors='ignore')
         else:
             texto = val.prettyPrint()
@@ -178,7 +585,7 @@ async def run_snmp_getnext(
      
         
 
-async def run_snmp_set(
+async def _snmp_set(
         ip: str,
         user: str,
         oid_numeric: str,
@@ -188,8 +595,8 @@ async def run_snmp_set(
         security_level: str = "noAuthNoPriv",
         auth_key: str = None,
         priv_key: str = None,
-        auth_protocol=usmNoAuthProtocol,
-        priv_protocol=usmNoPrivProtocol,
+        auth_protocol: str = None,
+        priv_protocol: str = None,
 ):
     """
     Realiza una operación SNMPv3 SET sobre un único OID.
@@ -208,17 +615,23 @@ async def run_snmp_set(
     """
 
 
+    # Los protocolos llegan por nombre (p. ej. "usmHMACSHAAuthProtocol") y se
+    # resuelven aquí, ya dentro del loop que ejecuta la operación
+    h = await _load_hlapi()
+    auth_protocol = getattr(h, auth_protocol or "usmNoAuthProtocol")
+    priv_protocol = getattr(h, priv_protocol or "usmNoPrivProtocol")
+
     # Mapeo de tipos string a clases pysnmp
     type_map = {
-        'Integer': Integer,
-        'OctetString': OctetString,
-        'IpAddress': IpAddress,
-        'Counter32': Counter32,
-        'Gauge32': Gauge32,
-        'TimeTicks': TimeTicks,
-        'Opaque': Opaque,
-        'Counter64': Counter64,
-        'Bits': Bits
+        'Integer': h.Integer,
+        'OctetString': h.OctetString,
+        'IpAddress': h.IpAddress,
+        'Counter32': h.Counter32,
+        'Gauge32': h.Gauge32,
+        'TimeTicks': h.TimeTicks,
+        'Opaque': h.Opaque,
+        'Counter64': h.Counter64,
+        'Bits': h.Bits
     }
     if value_type not in type_map:
         raise ValueError(f"Tipo SNMP no soportado: {value_type}")
@@ -226,7 +639,7 @@ async def run_snmp_set(
     pysnmp_type = type_map[value_type]
 
     # Conversión de valor a entero si corresponde
-    if pysnmp_type in (Integer, Counter32, Gauge32, TimeTicks, Counter64):
+    if pysnmp_type in (h.Integer, h.Counter32, h.Gauge32, h.TimeTicks, h.Counter64):
         try:
             cast_value = int(value)
         except ValueError:
@@ -257,7 +670,7 @@ async def run_snmp_set(
     
     # 3) Creación de UsmUserData
     try:
-        user_data = UsmUserData(user, **usm_kwargs)
+        user_data = h.UsmUserData(user, **usm_kwargs)
     except Exception as e:
         # Aquí te dice si alguno de los parámetros está mal
         print("[ERROR] al crear UsmUserData:", e)
@@ -266,13 +679,14 @@ async def run_snmp_set(
 
     try: 
         # --- Ejecución del SET ---
-        iterator = await set_cmd(
-            SnmpEngine(),
-            user_data,
-            await UdpTransportTarget.create((ip, 161)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid_numeric), pysnmp_type(cast_value))
-        )
+        with _engine(user, usm_kwargs) as engine:
+            iterator = await h.set_cmd(
+                engine,
+                user_data,
+                await h.UdpTransportTarget.create((ip, 161)),
+                h.ContextData(),
+                h.ObjectType(h.ObjectIdentity(oid_numeric), pysnmp_type(cast_value))
+            )
     except Exception as e:
         print("[ERROR] fallo interno en get_cmd:", e)
         traceback.print_exc()
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from collections import deque
+
+
+class LoopLagMonitor:
+    """
+    Mide el retraso (lag) del event loop de asyncio.
+
+    Cada `interval` segundos duerme y compara cuánto tardó realmente en
+    despertar; la diferencia es el tiempo que el loop estuvo ocupado con
+    otra cosa (p. ej. cifrado o codificación BER de SNMP).
+    """
+
+    def __init__(self, interval: float = 0.01, window: int = 1000):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        self.samples.clear()
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - t0 - self.interval
+            self.samples.append(max(lag, 0.0))
+
+    def report(self) -> dict:
+        """
+        Resumen en milisegundos de las últimas `window` muestras.
+        """
+        if not self.samples:
+            return {"samples": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return {
+            "samples": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
@@ -1,10 +1,14 @@
+import time
+_IMPORT_T0 = time.perf_counter()
+
+import os
 import threading
 import asyncio
 import json
 import logging
-from pysnmp import debug
 
 # Activa todos los logs detallados
+#from pysnmp import debug
 #debug.set_logger(debug.Debug('all'))
 #logging.basicConfig(level=logging.DEBUG)
 
@@ -13,23 +17,35 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-from pysnmp.carrier.asyncio.dgram import udp
-
-from controller import run_snmp_get, run_snmp_getnext, run_snmp_set
 
-# PySNMP v3 Protocol Constants
-from pysnmp.hlapi.v3arch.asyncio import (
-    usmNoAuthProtocol, usmNoPrivProtocol,
-    usmHMACMD5AuthProtocol, usmHMACSHAAuthProtocol,
-    usmDESPrivProtocol, usmAesCfb128Protocol
+# El resto de PySNMP (hlapi, motor de bajo nivel para traps) se importa bajo
+# demanda: ver controller.hlapi() y trap_receiver().
+from controller import (
+    run_snmp_get, run_snmp_getnext, run_snmp_set, get_protocol, hlapi, warm_engine,
+    configure_execution, shutdown_execution, EXECUTION_MODES,
 )
-from pysnmp.entity.engine import SnmpEngine
-from pysnmp.proto.rfc1902 import OctetString
+import controller
+from loop_lag import LoopLagMonitor
+
+# Perfil de arranque: tiempo de import de este módulo y de cada fase de
+# inicialización. Se consulta en /startup/profile o, con
+# SNMP_STARTUP_PROFILE=1, se imprime cuando el subsistema de traps termina.
+startup_profile = {
+    "import_ms": round((time.perf_counter() - _IMPORT_T0) * 1000, 2),
+    "phases_ms": {},
+    "trap_ready": False,
+    "trap_error": None,
+}
+STARTUP_PROFILE_LOG = os.environ.get("SNMP_STARTUP_PROFILE") == "1"
 
-# PySNMP de bajo nivel para el listener de traps
-from pysnmp.entity import engine, config
-from pysnmp.carrier.asyncio.dgram import udp
-from pysnmp.entity.rfc3413 import ntfrcv
+
+def _record_phase(name: str, t0: float) -> float:
+    """
+    Guarda la duración de una fase de arranque y devuelve el nuevo instante.
+    """
+    now = time.perf_counter()
+    startup_profile["phases_ms"][name] = round((now - t0) * 1000, 2)
+    return now
 
 app = FastAPI()
 
@@ -50,29 +66,69 @@ app.add_middleware(
 )
 
 # Mapeos para convertir strings del frontend a constantes PySNMP
+# (se guardan los nombres; controller los resuelve dentro de cada operación)
 AUTH_PROTOCOLS = {
-    "MD5": usmHMACMD5AuthProtocol,
-    "SHA": usmHMACSHAAuthProtocol,
+    "MD5": "usmHMACMD5AuthProtocol",
+    "SHA": "usmHMACSHAAuthProtocol",
 }
 PRIV_PROTOCOLS = {
-    "DES": usmDESPrivProtocol,
-    "AES": usmAesCfb128Protocol,
+    "DES": "usmDESPrivProtocol",
+    "AES": "usmAesCfb128Protocol",
 }
 
 # Cola compartida y loop del evento para comunicar hilo ↔ asyncio
 trap_queue: asyncio.Queue
 event_loop: asyncio.AbstractEventLoop
 
+# Lag del loop de FastAPI, para comparar los modos de ejecución SNMP. El
+# muestreo despierta al loop cada 10 ms, por eso solo corre con SNMP_LOOP_LAG=1
+loop_lag = LoopLagMonitor()
+LOOP_LAG_ENABLED = os.environ.get("SNMP_LOOP_LAG") == "1"
+
+
+def _execution_settings():
+    """
+    Lee y valida SNMP_EXECUTION_MODE y SNMP_WORKERS.
+    """
+    mode = os.environ.get("SNMP_EXECUTION_MODE", "inline")
+    if mode not in EXECUTION_MODES:
+        raise RuntimeError(
+            f"SNMP_EXECUTION_MODE inválido: {mode!r} (opciones: {', '.join(EXECUTION_MODES)})"
+        )
+
+    workers = os.environ.get("SNMP_WORKERS")
+    if not workers:
+        return mode, None
+    if not workers.isdigit() or int(workers) < 1:
+        raise RuntimeError(f"SNMP_WORKERS debe ser un entero positivo, se recibió: {workers!r}")
+    return mode, int(workers)
+
+
 @app.on_event("startup")
 async def startup_event():
     global trap_queue, event_loop
+    # Se valida la configuración antes de arrancar cualquier hilo
+    mode, workers = _execution_settings()
+
     trap_queue = asyncio.Queue()
     # Guardamos el loop de FastAPI
     event_loop = asyncio.get_event_loop()
-    # Arrancamos el listener en un hilo demonio
+    # Arrancamos el listener en un hilo demonio: los imports pesados y la
+    # construcción del motor de traps ocurren ahí, con HTTP ya atendiendo
     t = threading.Thread(target=trap_receiver, args=(event_loop,), daemon=True)
     t.start()
 
+    # Modo de ejecución de GET/GETNEXT/SET: inline | thread | process
+    configure_execution(mode, workers)
+    if LOOP_LAG_ENABLED:
+        loop_lag.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_lag.stop()
+    shutdown_execution()
+
 
 def trap_receiver(loop: asyncio.AbstractEventLoop):
     """
@@ -80,11 +136,57 @@ def trap_receiver(loop: asyncio.AbstractEventLoop):
     Arranca el SNMP Dispatcher (asyncIO) de forma bloqueante
     y encola cada trap recibido en `trap_queue`.
     """
+    try:
+        snmpEngine = _build_trap_engine(loop)
+    except Exception as e:
+        startup_profile["trap_error"] = str(e)
+        print("[ERROR] al iniciar el receptor de traps:", e)
+        raise
+
+    # Indica al dispatcher que hay 1 trabajo activo (evita que termine)
+    snmpEngine.transportDispatcher.jobStarted(1)
+
+    # Listo: a partir de aquí el dispatcher procesa traps
+    startup_profile["trap_ready"] = True
+    startup_profile["total_ms"] = round((time.perf_counter() - _IMPORT_T0) * 1000, 2)
+    if STARTUP_PROFILE_LOG:
+        print("[STARTUP PROFILE]", json.dumps(startup_profile))
+
+    # Bloquea aquí y procesa traps
+    snmpEngine.transportDispatcher.runDispatcher()
+
+
+def _build_trap_engine(loop: asyncio.AbstractEventLoop):
+    """
+    Importa PySNMP de bajo nivel, precalienta hlapi y un SnmpEngine para que
+    la primera petición /snmp/* no pague ninguno de los dos y configura el
+    motor de traps.
+    Cada paso queda registrado en `startup_profile`.
+    """
+    t0 = time.perf_counter()
+
     # 1) Creamos un event loop para este hilo y lo asociamos
     thread_loop = asyncio.new_event_loop()
     asyncio.set_event_loop(thread_loop)
 
+    # PySNMP de bajo nivel para el listener de traps
+    from pysnmp.entity import config
+    from pysnmp.entity.engine import SnmpEngine
+    from pysnmp.carrier.asyncio.dgram import udp
+    from pysnmp.entity.rfc3413 import ntfrcv
+    from pysnmp.proto.rfc1902 import OctetString
+    t = _record_phase("trap_imports", t0)
+
+    # Precalienta hlapi (GET/GETNEXT/SET) mientras HTTP ya está sirviendo
+    hlapi()
+    t = _record_phase("hlapi_warmup", t)
+
+    # Y el SnmpEngine que usará la primera operación SNMP
+    warm_engine()
+    t = _record_phase("snmp_engine_warmup", t)
+
     snmpEngine = SnmpEngine()
+    t = _record_phase("trap_engine", t)
     #router_engine_id = OctetString(hexValue='80001f8880b237e761f420846800000000') ESTE ES DESDE EL CENTOS
     #EL SIGUIENTE ES DESDE EL engineID propio del router
     #router_engine_id = OctetString(hexValue='800000090300AABBCC000100')
@@ -95,36 +197,36 @@ def trap_receiver(loop: asyncio.AbstractEventLoop):
         '800000090300aabbcc000100': {
             'username': 'UsuarioTrap',
             'authKey': '0123456789',
-            'authProtocol': usmHMACSHAAuthProtocol,
-            'privProtocol': usmNoPrivProtocol
+            'authProtocol': get_protocol('usmHMACSHAAuthProtocol'),
+            'privProtocol': get_protocol('usmNoPrivProtocol')
         },
     # R2:
         '800000090300AABBCC000200': {
             'username': 'UsuarioTrap',
             'authKey': '0123456789',
-            'authProtocol': usmHMACSHAAuthProtocol,
-            'privProtocol': usmNoPrivProtocol
+            'authProtocol': get_protocol('usmHMACSHAAuthProtocol'),
+            'privProtocol': get_protocol('usmNoPrivProtocol')
         },
     # R3: 
         '800000090300AABBCC000300': {
             'username': 'UsuarioTrap',
             'authKey': '0123456789',
-            'authProtocol': usmHMACSHAAuthProtocol,
-            'privProtocol': usmNoPrivProtocol
+            'authProtocol': get_protocol('usmHMACSHAAuthProtocol'),
+            'privProtocol': get_protocol('usmNoPrivProtocol')
         },
     # PC2: 
         '80001f8880b237e761f420846800000000': {
             'username': 'ubuntuA',
             'authKey': '1234567890',
-            'authProtocol': usmHMACMD5AuthProtocol,
-            'privProtocol': usmNoPrivProtocol
+            'authProtocol': get_protocol('usmHMACMD5AuthProtocol'),
+            'privProtocol': get_protocol('usmNoPrivProtocol')
         },
     # PC1: 
         '80001f88808e936d0fd94e366800000000': {
             'username': 'ubuntuA',
             'authKey': '1234567890',
-            'authProtocol': usmHMACMD5AuthProtocol,
-            'privProtocol': usmNoPrivProtocol
+            'authProtocol': get_protocol('usmHMACMD5AuthProtocol'),
+            'privProtocol': get_protocol('usmNoPrivProtocol')
         },
         # Se puede agregar más routers o dispositivos aquí
     }
@@ -142,6 +244,7 @@ def trap_receiver(loop: asyncio.AbstractEventLoop):
             securityEngineId=engine_id
         )
     config.addV1System(snmpEngine, 'my-area', 'public')
+    t = _record_phase("trap_users", t)
     
     print('El valor de snmpEngine es: ', snmpEngine.snmpEngineID.prettyPrint())
     # Escucha traps en UDP/162
@@ -150,6 +253,7 @@ def trap_receiver(loop: asyncio.AbstractEventLoop):
         udp.domainName,
         udp.UdpTransport().openServerMode(('0.0.0.0', 162))
     )
+    t = _record_phase("trap_transport", t)
 
     def cbFun(snmpEngine, stateReference, contextEngineId, contextName, varBinds, cbCtx):
         print("Entrando en cbFun")
@@ -180,10 +284,9 @@ def trap_receiver(loop: asyncio.AbstractEventLoop):
     # Registra el receptor de notificaciones
     ntfrcv.NotificationReceiver(snmpEngine, cbFun)
 
-    # Indica al dispatcher que hay 1 trabajo activo (evita que termine)
-    snmpEngine.transportDispatcher.jobStarted(1)
-    # Bloquea aquí y procesa traps
-    snmpEngine.transportDispatcher.runDispatcher()
+    _record_phase("trap_receiver", t)
+
+    return snmpEngine
 
 
 @app.get("/")
@@ -191,6 +294,31 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/startup/profile")
+async def startup_profile_report():
+    """
+    Informe de arranque: tiempo de import de main.py y duración (ms) de cada
+    fase de inicialización del subsistema de traps.
+    """
+    return startup_profile
+
+
+@app.get("/metrics/loop-lag")
+async def loop_lag_report(reset: bool = Query(False, description="Vacía las muestras tras leerlas")):
+    """
+    Lag del event loop (ms) en las últimas muestras y modo de ejecución SNMP
+    activo (SNMP_EXECUTION_MODE). Requiere SNMP_LOOP_LAG=1.
+    """
+    report = {
+        "enabled": LOOP_LAG_ENABLED,
+        "execution_mode": controller.EXECUTION_MODE,
+        **loop_lag.report(),
+    }
+    if reset:
+        loop_lag.reset()
+    return report
+
+
 @app.get("/snmp/get")
 async def snmp_get(
         ip: str, 
@@ -222,8 +350,8 @@ async def snmp_get(
         raise HTTPException(400, "Se requiere priv_key")
 
     # Mapear cadenas a constantes PySNMP
-    auth_proto = AUTH_PROTOCOLS.get(auth_protocol, usmNoAuthProtocol)
-    priv_proto = PRIV_PROTOCOLS.get(priv_protocol, usmNoPrivProtocol)
+    auth_proto = AUTH_PROTOCOLS.get(auth_protocol, "usmNoAuthProtocol")
+    priv_proto = PRIV_PROTOCOLS.get(priv_protocol, "usmNoPrivProtocol")
 
     print("parametros que se envian a la funcion run_snmp_get: ", ip, user, oid, security_level, auth_key, auth_protocol, priv_key, priv_protocol)
 
@@ -273,8 +401,8 @@ async def snmp_getnext(
         raise HTTPException(400, "Se requiere priv_key")
 
     # Mapear cadenas a constantes PySNMP
-    auth_proto = AUTH_PROTOCOLS.get(auth_protocol, usmNoAuthProtocol)
-    priv_proto = PRIV_PROTOCOLS.get(priv_protocol, usmNoPrivProtocol)
+    auth_proto = AUTH_PROTOCOLS.get(auth_protocol, "usmNoAuthProtocol")
+    priv_proto = PRIV_PROTOCOLS.get(priv_protocol, "usmNoPrivProtocol")
 
     try:
         if security_level == "noAuthNoPriv":
@@ -307,7 +435,7 @@ class SNMPSetRequest(BaseModel):
     user: str
     oid: str
     value: str
-    type: str   # Debe coincidir con uno de los keys de type_map en run_snmp_set
+    type: str   # Debe coincidir con uno de los keys de type_map en _snmp_set
     security_level: str = Query(
         "noAuthNoPriv",
         description="Nivel SNMPv3: noAuthNoPriv | authNoPriv | authPriv"
@@ -342,8 +470,8 @@ async def snmp_set(req: SNMPSetRequest):
 
 
     # 2) Mapear protocolos de cadena a constantes PySNMP
-    auth_proto = AUTH_PROTOCOLS.get(req.auth_protocol, usmNoAuthProtocol)
-    priv_proto = PRIV_PROTOCOLS.get(req.priv_protocol, usmNoPrivProtocol)
+    auth_proto = AUTH_PROTOCOLS.get(req.auth_protocol, "usmNoAuthProtocol")
+    priv_proto = PRIV_PROTOCOLS.get(req.priv_protocol, "usmNoPrivProtocol")
 
 
     # 3) Llamada a la función run_snmp_set
@@ -0,0 +1,253 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import controller
+
+
+async def _slow(delay):
+    await asyncio.sleep(delay)
+    return delay
+
+
+async def _fail():
+    raise ValueError("fallo en el worker")
+
+
+class _Stop(Exception):
+    pass
+
+
+def _capture_usm(monkeypatch):
+    # Sustituye UsmUserData para ver qué protocolos recibe, sin tocar la red
+    h = pytest.importorskip("pysnmp.hlapi.v3arch.asyncio")
+    captured = {}
+
+    def fake_usm(user, **kwargs):
+        captured.update(kwargs)
+        raise _Stop
+
+    monkeypatch.setattr(h, "UsmUserData", fake_usm)
+    return h, captured
+
+
+def _agent(address, user, auth_key):
+    # Agente SNMPv3 mínimo (authNoPriv, HMAC-SHA) en el loop en curso
+    from pysnmp.carrier.asyncio.dgram import udp
+    from pysnmp.entity import config, engine
+    from pysnmp.entity.rfc3413 import cmdrsp, context
+
+    snmp_engine = engine.SnmpEngine()
+    config.add_transport(
+        snmp_engine, udp.DOMAIN_NAME, udp.UdpTransport().open_server_mode((address, 161))
+    )
+    config.add_v3_user(snmp_engine, user, config.USM_AUTH_HMAC96_SHA, auth_key)
+    config.add_vacm_user(snmp_engine, 3, user, "authNoPriv", (1, 3, 6), (1, 3, 6))
+    cmdrsp.GetCommandResponder(snmp_engine, context.SnmpContext(snmp_engine))
+    snmp_engine.transport_dispatcher.job_started(1)
+    return snmp_engine
+
+
+def _can_bind(address):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.bind((address, 161))
+        except OSError:
+            return False
+    return True
+
+
+def test_import_does_not_load_hlapi():
+    code = (
+        "import sys, controller; "
+        "sys.exit('pysnmp.hlapi.v3arch.asyncio' in sys.modules)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_get_resolves_protocol_names(monkeypatch):
+    h, captured = _capture_usm(monkeypatch)
+    with pytest.raises(_Stop):
+        asyncio.run(controller.run_snmp_get(
+            "127.0.0.1", "admin", "1.3.6.1.2.1.1.1.0",
+            security_level="authPriv",
+            auth_key="clave1234", auth_protocol="usmHMACSHAAuthProtocol",
+            priv_key="clave1234", priv_protocol="usmAesCfb128Protocol",
+        ))
+    assert captured["authProtocol"] == h.usmHMACSHAAuthProtocol
+    assert captured["privProtocol"] == h.usmAesCfb128Protocol
+
+
+def test_set_defaults_to_no_auth_no_priv_protocols(monkeypatch):
+    h, captured = _capture_usm(monkeypatch)
+    with pytest.raises(_Stop):
+        asyncio.run(controller.run_snmp_set(
+            "127.0.0.1", "admin", "1.3.6.1.2.1.1.5.0", "router", "OctetString",
+            security_level="authPriv", auth_key="clave1234", priv_key="clave1234",
+        ))
+    assert captured["authProtocol"] == h.usmNoAuthProtocol
+    assert captured["privProtocol"] == h.usmNoPrivProtocol
+
+
+def test_warm_engine_is_used_by_next_operation():
+    pytest.importorskip("pysnmp.hlapi.v3arch.asyncio")
+    controller.warm_engine()
+    spare = controller._spare_engines[-1]
+    assert controller._new_engine() is spare
+
+
+def test_configure_execution_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        controller.configure_execution("fork")
+    assert controller.EXECUTION_MODE == "inline"
+
+
+def test_shutdown_execution_returns_to_inline():
+    controller.configure_execution("thread", 2)
+    try:
+        assert controller.EXECUTION_MODE == "thread"
+    finally:
+        controller.shutdown_execution()
+    assert controller.EXECUTION_MODE == "inline"
+    assert controller._workers == []
+
+
+def test_inline_runs_on_caller_loop():
+    controller.configure_execution("inline", 4)
+    assert controller._workers == []
+    assert asyncio.run(controller._dispatch(_slow, 0)) == 0
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_worker_runs_operations_concurrently(mode):
+    # Un solo worker debe tener muchas operaciones en vuelo a la vez
+    async def run():
+        t0 = time.perf_counter()
+        results = await asyncio.gather(
+            *[controller._dispatch(_slow, 0.3) for _ in range(20)]
+        )
+        return results, time.perf_counter() - t0
+
+    controller.configure_execution(mode, 1)
+    try:
+        # El primer viaje incluye el arranque del worker
+        asyncio.run(controller._dispatch(_slow, 0))
+        results, elapsed = asyncio.run(run())
+        with pytest.raises(ValueError, match="fallo en el worker"):
+            asyncio.run(controller._dispatch(_fail))
+    finally:
+        controller.shutdown_execution()
+
+    assert results == [0.3] * 20
+    assert elapsed < 2
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.closed = False
+
+    def close_dispatcher(self):
+        self.closed = True
+
+
+def test_engine_cache_is_keyed_by_credentials(monkeypatch):
+    monkeypatch.setattr(controller, "_new_engine", _FakeEngine)
+    cache = controller._EngineCache(size=2)
+
+    with cache.acquire(("admin", ("authKey", "clave-a"))) as a1:
+        pass
+    with cache.acquire(("admin", ("authKey", "clave-b"))) as b:
+        pass
+    with cache.acquire(("admin", ("authKey", "clave-a"))) as a2:
+        pass
+    assert a1 is a2
+    assert a1 is not b
+
+
+def test_engine_cache_closes_evicted_engine_after_use(monkeypatch):
+    monkeypatch.setattr(controller, "_new_engine", _FakeEngine)
+    cache = controller._EngineCache(size=1)
+
+    with cache.acquire("credenciales-a") as busy:
+        # Se desaloja mientras está en uso: se cierra al terminar, no antes
+        with cache.acquire("credenciales-b") as other:
+            assert not busy.closed
+        assert not other.closed
+    assert busy.closed
+
+    with cache.acquire("credenciales-c"):
+        pass
+    assert other.closed
+
+
+def test_thread_worker_stop_fails_operations_in_flight():
+    async def run():
+        pending = asyncio.ensure_future(controller._dispatch(_slow, 10))
+        await asyncio.sleep(0.1)
+        t0 = time.perf_counter()
+        controller.shutdown_execution()
+        with pytest.raises(RuntimeError, match="se detuvo"):
+            await pending
+        return time.perf_counter() - t0
+
+    controller.configure_execution("thread", 1)
+    worker = controller._workers[0]
+    try:
+        assert asyncio.run(run()) < 2
+    finally:
+        controller.shutdown_execution()
+    assert worker.loop.is_closed()
+
+
+def test_dead_process_worker_is_replaced():
+    async def run():
+        assert await controller._dispatch(_slow, 0) == 0
+        worker = controller._workers[0]
+        pending = asyncio.ensure_future(controller._dispatch(_slow, 10))
+        await asyncio.sleep(0.2)
+        worker.process.kill()
+        with pytest.raises(RuntimeError, match="terminó"):
+            await asyncio.wait_for(pending, 5)
+        # La siguiente operación arranca un proceso nuevo
+        assert await controller._dispatch(_slow, 0) == 0
+        assert controller._workers[0] is not worker
+
+    controller.configure_execution("process", 1)
+    try:
+        asyncio.run(run())
+    finally:
+        controller.shutdown_execution()
+
+
+def test_same_user_with_different_keys_does_not_interfere():
+    pytest.importorskip("pysnmp.hlapi.v3arch.asyncio")
+    routers = {"127.0.0.2": "clave-router-a", "127.0.0.3": "clave-router-b"}
+    if not all(_can_bind(ip) for ip in routers):
+        pytest.skip("se necesita poder abrir UDP/161 en 127.0.0.2 y 127.0.0.3")
+
+    def get(ip, auth_key):
+        return controller.run_snmp_get(
+            ip, "admin", "1.3.6.1.2.1.1.1.0",
+            security_level="authNoPriv",
+            auth_key=auth_key, auth_protocol="usmHMACSHAAuthProtocol",
+        )
+
+    async def run():
+        agents = [_agent(ip, "admin", key) for ip, key in routers.items()]
+        try:
+            # Peticiones intercaladas: mismo usuario, claves distintas, y una
+            # con la clave mal escrita que no debe afectar a las demás
+            calls = [get(ip, key) for _ in range(5) for ip, key in routers.items()]
+            calls.append(get("127.0.0.2", "clave-mal-escrita"))
+            return await asyncio.gather(*calls, return_exceptions=True)
+        finally:
+            for agent in agents:
+                agent.close_dispatcher()
+
+    *good, bad = asyncio.run(run())
+    assert all(isinstance(r, list) for r in good), good
+    assert isinstance(bad, Exception)
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from loop_lag import LoopLagMonitor
+
+
+def test_report_without_samples():
+    assert LoopLagMonitor().report() == {
+        "samples": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0,
+    }
+
+
+def test_report_detects_blocking_callback():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        # Bloquea el loop 200 ms, como lo haría trabajo de CPU síncrono
+        asyncio.get_running_loop().call_soon(time.sleep, 0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    report = monitor.report()
+    assert report["samples"] > 1
+    assert report["max_ms"] >= 150
+    assert report["p99_ms"] <= report["max_ms"]
+    assert report["mean_ms"] < report["max_ms"]
+
+    monitor.reset()
+    assert monitor.report()["samples"] == 0
@@ -0,0 +1,44 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import main
+
+
+def test_import_does_not_load_hlapi():
+    code = (
+        "import sys, main; "
+        "sys.exit('pysnmp.hlapi.v3arch.asyncio' in sys.modules)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_startup_profile_report():
+    report = asyncio.run(main.startup_profile_report())
+    assert report["import_ms"] > 0
+    assert isinstance(report["phases_ms"], dict)
+    assert report["trap_ready"] is False
+    assert report["trap_error"] is None
+
+
+def test_record_phase(monkeypatch):
+    monkeypatch.setitem(main.startup_profile, "phases_ms", {})
+    t = main._record_phase("prueba", 0.0)
+    assert main.startup_profile["phases_ms"]["prueba"] > 0
+    assert t > 0
+
+
+def test_trap_receiver_reports_error(monkeypatch):
+    def fail(loop):
+        raise OSError("puerto 162 ocupado")
+
+    monkeypatch.setattr(main, "_build_trap_engine", fail)
+    monkeypatch.setitem(main.startup_profile, "trap_error", None)
+    with pytest.raises(OSError):
+        main.trap_receiver(None)
+    assert main.startup_profile["trap_error"] == "puerto 162 ocupado"
+    assert main.startup_profile["trap_ready"] is False